@@ -1,7 +1,14 @@
 import os
-import xml.etree.ElementTree as ET
-import pandas as pd
+import io
+# lxml is preferred; stdlib ElementTree is a zero-dependency streaming fallback
+try:
+    from lxml import etree as _ET
+    _FAST = True
+except ImportError:
+    import xml.etree.ElementTree as _ET
+    _FAST = False
 import json
+import orjson
 from google.cloud import bigquery
 from google.api_core import retry
 from dotenv import load_dotenv
@@ -10,59 +17,306 @@ import argparse
 from typing import Dict, List, Any
 from google.oauth2 import service_account
 import datetime
+import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fill in settings from .env once, at import; variables already set in the
+# environment take precedence
+load_dotenv()
+GCP_PROJECT_ID = os.getenv('GCP_PROJECT_ID')
+BIGQUERY_DATASET = os.getenv('BIGQUERY_DATASET', 'hl7_data')
+
+# Hardcoded credentials path for testing
+CREDENTIALS_PATH = r"C:\Users\19089\azurepractice\fhir\fhir_datafeed\skyeyez.json"
+
+# Buffered rows of a section that trigger a load before flush() is called;
+# also the most rows submitted in a single BigQuery load job
+FLUSH_ROWS = 10000
+
+# Parsed datetimes are naive UTC; orjson writes them as RFC 3339 with a 'Z'
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+# Clark-notation CDA tags, resolved once so element lookups by tag need no
+# namespace map
+NS = 'urn:hl7-org:v3'
+CDA = '{%s}' % NS
+CDA_TYPE_ID = CDA + 'typeId'
+CDA_TEMPLATE_ID = CDA + 'templateId'
+CDA_PATIENT = CDA + 'patient'
+CDA_ENCOUNTER = CDA + 'encounter'
+CDA_ACT = CDA + 'act'
+CDA_SUBSTANCE_ADMINISTRATION = CDA + 'substanceAdministration'
+CDA_ID = CDA + 'id'
+CDA_CODE = CDA + 'code'
+CDA_STATUS_CODE = CDA + 'statusCode'
+CDA_EFFECTIVE_TIME = CDA + 'effectiveTime'
+CDA_LOW = CDA + 'low'
+CDA_HIGH = CDA + 'high'
+CDA_GIVEN = CDA + 'given'
+CDA_FAMILY = CDA + 'family'
+CDA_GENDER = CDA + 'administrativeGenderCode'
+CDA_BIRTH_TIME = CDA + 'birthTime'
+CDA_SECTION = CDA + 'section'
+
+# Elements extracted whole from the iterparse stream
+CDA_ENTRY_TAGS = frozenset((
+    CDA_PATIENT,
+    CDA_ENCOUNTER,
+    CDA_ACT,
+    CDA_SUBSTANCE_ADMINISTRATION,
+))
+
+# Elements lxml's iterparse reports; sections are included only so their
+# narrative and wrappers can be freed once the section has been read
+CDA_STREAM_TAGS = (CDA_TYPE_ID, CDA_TEMPLATE_ID, CDA_SECTION) + tuple(CDA_ENTRY_TAGS)
+
+
+def _nullable(field_name: str, field_type: str = 'STRING') -> bigquery.SchemaField:
+    """Build a NULLABLE schema field."""
+    return bigquery.SchemaField(field_name, field_type, mode='NULLABLE')
+
+
+# BigQuery schema of each section table, matching the columns the parser and
+# the section flatteners produce
+SECTION_SCHEMAS = {
+    'metadata': [
+        _nullable('document_type'),
+        _nullable('document_type_root'),
+        _nullable('template_ids'),
+    ],
+    'patient': [
+        bigquery.SchemaField('patient_ids', 'STRING', mode='REPEATED'),
+        bigquery.SchemaField('names', 'RECORD', mode='REPEATED', fields=[
+            _nullable('given'),
+            _nullable('family'),
+        ]),
+        _nullable('gender'),
+        _nullable('gender_display'),
+        _nullable('birth_time', 'TIMESTAMP'),
+    ],
+    'encounter': [
+        _nullable('encounter_id'),
+        _nullable('encounter_code'),
+        _nullable('encounter_code_system'),
+        _nullable('encounter_code_display'),
+        _nullable('encounter_start', 'TIMESTAMP'),
+        _nullable('encounter_end', 'TIMESTAMP'),
+    ],
+    'problems': [
+        _nullable('problem_ids'),
+        _nullable('problem_code'),
+        _nullable('problem_code_system'),
+        _nullable('problem_code_display'),
+        _nullable('problem_status'),
+        _nullable('problem_start', 'TIMESTAMP'),
+        _nullable('problem_end', 'TIMESTAMP'),
+    ],
+    'medications': [
+        _nullable('medication_ids'),
+        _nullable('medication_code'),
+        _nullable('medication_code_system'),
+        _nullable('medication_code_display'),
+        _nullable('medication_status'),
+        _nullable('medication_start', 'TIMESTAMP'),
+        _nullable('medication_end', 'TIMESTAMP'),
+    ],
+}
+
+# Parsed fields loaded into TIMESTAMP columns; the parser emits these as
+# datetime objects (or None) so no conversion pass is needed before loading
+TIMESTAMP_FIELDS = frozenset(
+    field.name
+    for schema in SECTION_SCHEMAS.values()
+    for field in schema
+    if field.field_type == 'TIMESTAMP'
+)
+
+NAMESPACES = {
+    'cda': NS,
+    'sdtc': 'urn:hl7-org:sdtc',
+    'xsi': 'http://www.w3.org/2001/XMLSchema-instance'
+}
+
+def _compile_path(path: str):
+    """Compile an element path once; under stdlib ElementTree it runs via findall."""
+    if _FAST:
+        return _ET.XPath(path, namespaces=NAMESPACES)
+    return lambda elem: elem.findall(path, NAMESPACES)
+
+
+def _compile_template_check(template_root: str):
+    """Build a test for whether an element carries the given templateId root."""
+    if _FAST:
+        return _ET.XPath(f"cda:templateId/@root = '{template_root}'", namespaces=NAMESPACES)
+    path = f"cda:templateId[@root='{template_root}']"
+    return lambda elem: elem.find(path, NAMESPACES) is not None
+
+
+# XPath expressions compiled once and reused for every element visited
+XP_ID = _compile_path('.//cda:id')
+XP_NAME = _compile_path('.//cda:name')
+
+# Problem and medication entries have a fixed C-CDA layout, so their fields are
+# read along known child paths instead of searching the whole entry subtree
+XP_ACT_OBS_ID = _compile_path('cda:entryRelationship/cda:observation/cda:id')
+XP_ACT_OBS_VALUE = _compile_path('cda:entryRelationship/cda:observation/cda:value')
+XP_MED_CODE = _compile_path('cda:consumable/cda:manufacturedProduct/cda:manufacturedMaterial/cda:code')
+
+# Entry template filters, evaluated inside libxml2 (when lxml is available)
+# against each streamed element
+PROBLEM_ACT_TEMPLATE = '2.16.840.1.113883.10.20.22.4.3'
+MEDICATION_ACTIVITY_TEMPLATE = '2.16.840.1.113883.10.20.22.4.16'
+XP_IS_PROBLEM_ACT = _compile_template_check(PROBLEM_ACT_TEMPLATE)
+XP_IS_MEDICATION_ACTIVITY = _compile_template_check(MEDICATION_ACTIVITY_TEMPLATE)
+
+def _first(elem, tag):
+    """Return the first descendant with the given Clark-notation tag, or None.
+
+    Iteration stops at the first match instead of collecting every one.
+    """
+    return next(elem.iter(tag), None)
+
+
+# Flatteners specialised to the fields the parser emits for each section, so
+# rows are not re-inspected value by value to work out how to encode them
+def _flatten_problem(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a problem row, joining its IDs with a pipe."""
+    return {
+        key: '|'.join(value) if key == 'problem_ids' else value
+        for key, value in item.items()
+    }
+
+
+def _flatten_native(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Pass through a row whose values BigQuery loads from JSON as they are."""
+    return item
+
+
+def _flatten_generic(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a row of unknown shape by inspecting each value."""
+    flattened_item = {}
+    
+    for key, value in item.items():
+        # Timestamps are serialized natively by orjson
+        if isinstance(value, datetime.datetime):
+            flattened_item[key] = value
+            continue
+        
+        if isinstance(value, list):
+            # Handle lists of strings (like IDs)
+            if all(isinstance(x, str) for x in value):
+                # Join the list with a delimiter
+                flattened_item[key] = '|'.join(value)
+            # Handle lists of dictionaries (like names)
+            elif all(isinstance(x, dict) for x in value):
+                # Create separate columns for each dictionary key
+                for i, dict_item in enumerate(value):
+                    for dict_key, dict_value in dict_item.items():
+                        if isinstance(dict_value, str):
+                            # Create a column name like 'names_0_given'
+                            column_name = f"{key}_{i}_{dict_key}"
+                            flattened_item[column_name] = dict_value
+            else:
+                # For other types of lists, convert to string
+                flattened_item[key] = '|'.join(str(x) for x in value)
+        elif isinstance(value, dict):
+            # Handle dictionaries by creating separate columns
+            for dict_key, dict_value in value.items():
+                if isinstance(dict_value, str):
+                    flattened_item[f"{key}_{dict_key}"] = dict_value
+                else:
+                    # For non-string values, convert to string
+                    flattened_item[f"{key}_{dict_key}"] = str(dict_value)
+        else:
+            # For non-list, non-dict values, convert to string to avoid type issues
+            flattened_item[key] = str(value) if value is not None else None
+    return flattened_item
+
+
 class HL7ToBigQuery:
+    # Row flatteners per section; anything else goes through _flatten_generic
+    _FLATTENERS = {
+        'patient': _flatten_native,
+        'encounter': _flatten_native,
+        'problems': _flatten_problem,
+        'medications': _flatten_native,
+    }
+
+    # BigQuery client and credentials shared by every processor in the
+    # process, created on first use by _ensure_client
+    _client = None
+    _credentials = None
+    _dataset_checked = False
+    _client_lock = threading.Lock()
+
     def __init__(self):
-        # Load environment variables
-        load_dotenv(override=True)
-        
-        # Get environment variables
-        self.project_id = os.getenv('GCP_PROJECT_ID')
-        logger.info(f"Environment variables loaded. GCP_PROJECT_ID: {self.project_id}")
-        
+        self.project_id = GCP_PROJECT_ID
         if not self.project_id:
             raise ValueError("GCP_PROJECT_ID environment variable is not set")
             
-        self.dataset_id = os.getenv('BIGQUERY_DATASET', 'hl7_data')
+        self.dataset_id = BIGQUERY_DATASET
         
-        # Hardcoded credentials path for testing
-        credentials_path = r"C:\Users\19089\azurepractice\fhir\fhir_datafeed\skyeyez.json"
+        self.client = self._ensure_client()
         
-        # Log the credentials path for debugging
-        logger.info(f"Using credentials from: {credentials_path}")
-        logger.info(f"Using project ID: {self.project_id}")
+        # Parsed rows waiting to be loaded, keyed by section name; see flush()
+        self._row_buffers = defaultdict(list)
         
-        # Check if file exists
-        if not os.path.exists(credentials_path):
-            raise FileNotFoundError(f"Credentials file not found at: {credentials_path}")
+        # Invalid HL7 datetimes seen while parsing; files may be parsed on
+        # several threads at once
+        self._bad_dt_count = 0
+        self._bad_dt_lock = threading.Lock()
         
-        # Explicitly create credentials
-        try:
-            credentials = service_account.Credentials.from_service_account_file(
-                credentials_path
-            )
-            logger.info("Successfully loaded credentials")
-            
-            # Print service account email for debugging
-            service_account_email = credentials.service_account_email
-            logger.info(f"Service account email: {service_account_email}")
+        # Check the dataset once per process; section tables are created by
+        # the load jobs themselves
+        cls = type(self)
+        with cls._client_lock:
+            if not cls._dataset_checked:
+                self._check_dataset_exists()
+                cls._dataset_checked = True
+
+    @classmethod
+    def _ensure_client(cls) -> bigquery.Client:
+        """Create the shared BigQuery client on first use and return it."""
+        with cls._client_lock:
+            if cls._client is not None:
+                return cls._client
+            
+            # Log the credentials path for debugging
+            logger.info(f"Using credentials from: {CREDENTIALS_PATH}")
+            logger.info(f"Using project ID: {GCP_PROJECT_ID}")
+            
+            # Check if file exists
+            if not os.path.exists(CREDENTIALS_PATH):
+                raise FileNotFoundError(f"Credentials file not found at: {CREDENTIALS_PATH}")
+            
+            # Explicitly create credentials
+            try:
+                credentials = service_account.Credentials.from_service_account_file(
+                    CREDENTIALS_PATH
+                )
+                logger.info("Successfully loaded credentials")
+                
+                # Print service account email for debugging
+                service_account_email = credentials.service_account_email
+                logger.info(f"Service account email: {service_account_email}")
+                
+            except Exception as e:
+                logger.error(f"Error loading credentials: {str(e)}")
+                raise
             
-        except Exception as e:
-            logger.error(f"Error loading credentials: {str(e)}")
-            raise
-        
-        # Create BigQuery client with explicit credentials
-        self.client = bigquery.Client(
-            project=self.project_id,
-            credentials=credentials
-        )
-        
-        # Check if dataset exists
-        self._check_dataset_exists()
+            # Create BigQuery client with explicit credentials
+            cls._credentials = credentials
+            cls._client = bigquery.Client(
+                project=GCP_PROJECT_ID,
+                credentials=credentials
+            )
+            return cls._client
 
     def _check_dataset_exists(self):
         """Check if BigQuery dataset exists and create it if it doesn't."""
@@ -77,545 +331,489 @@ class HL7ToBigQuery:
             logger.info("Required permissions: bigquery.datasets.create")
             raise
 
-    def _create_table_if_not_exists(self, section_name: str, schema: List[bigquery.SchemaField]):
-        """Create BigQuery table if it doesn't exist."""
-        table_id = f"{self.project_id}.{self.dataset_id}.{section_name.lower()}"
-        table = bigquery.Table(table_id, schema=schema)
-        
-        try:
-            self.client.get_table(table)
-            logger.info(f"Table {table_id} already exists")
-        except Exception as e:
-            try:
-                table = self.client.create_table(table)
-                logger.info(f"Created table {table_id}")
-            except Exception as create_error:
-                logger.error(f"Error creating table {table_id}: {str(create_error)}")
-                raise
-
-    def _update_table_schema(self, table_id: str, new_schema: List[bigquery.SchemaField]):
-        """Update an existing table's schema to include new fields."""
-        try:
-            # Get the current table
-            table = self.client.get_table(table_id)
-            
-            # Get current schema field names
-            current_field_names = {field.name for field in table.schema}
-            
-            # Check if we need to add any fields
-            fields_to_add = []
-            for field in new_schema:
-                if field.name not in current_field_names:
-                    fields_to_add.append(field)
-            
-            if fields_to_add:
-                # Update the table with new fields
-                table.schema = table.schema + fields_to_add
-                table = self.client.update_table(table, ["schema"])
-                
-                logger.info(f"Updated table {table_id} schema with {len(fields_to_add)} new fields")
-                for field in fields_to_add:
-                    logger.info(f"Added field: {field.name} ({field.field_type})")
-            else:
-                logger.info(f"No schema updates needed for table {table_id}")
-                
-        except Exception as e:
-            logger.error(f"Error updating table schema: {str(e)}")
-            raise
-
-    def _get_segment_schema(self, section_name: str, sample_data: Dict[str, Any]) -> List[bigquery.SchemaField]:
-        """Generate BigQuery schema based on section data."""
-        schema = []
-        
-        # Define timestamp fields that should be TIMESTAMP type
-        timestamp_fields = ['encounter_start', 'encounter_end', 'problem_start', 'problem_end', 'medication_start', 'medication_end', 'birth_time']
-        
-        # Special handling for problems table
-        if section_name.lower() == 'problems':
-            # Always include problem_end as TIMESTAMP
-            schema.append(bigquery.SchemaField('problem_end', 'TIMESTAMP', mode='NULLABLE'))
-            logger.info("Added problem_end field to schema as TIMESTAMP")
-        
-        for field_name, value in sample_data.items():
-            # Skip problem_end if we already added it
-            if section_name.lower() == 'problems' and field_name == 'problem_end':
-                continue
-                
-            # Default to STRING type for all fields to avoid type conversion issues
-            field_type = 'STRING'
-            
-            # Only set specific types for fields we're certain about
-            if field_name in timestamp_fields:
-                field_type = 'TIMESTAMP'
-                logger.info(f"Setting field {field_name} to TIMESTAMP type")
-            
-            schema.append(bigquery.SchemaField(
-                field_name.lower(),
-                field_type,
-                mode='NULLABLE'
-            ))
-        return schema
-
     def _convert_hl7_datetime(self, hl7_datetime: str) -> datetime.datetime:
         """Convert HL7 datetime format to datetime object for BigQuery."""
         if not hl7_datetime:
             return None
-            
+        
+        # HL7 format: YYYYMMDDHHMMSS
+        # Example: 19651115062241
+        b = hl7_datetime.encode()
+        if len(b) < 14 or not b[:14].isdigit():
+            self._count_bad_datetime()
+            return None
+        
+        # Read the digits straight from the ASCII bytes (b'0' == 48) rather
+        # than slicing out and int()-parsing six substrings
+        year = (b[0] - 48) * 1000 + (b[1] - 48) * 100 + (b[2] - 48) * 10 + (b[3] - 48)
+        month = (b[4] - 48) * 10 + (b[5] - 48)
+        day = (b[6] - 48) * 10 + (b[7] - 48)
+        hour = (b[8] - 48) * 10 + (b[9] - 48)
+        minute = (b[10] - 48) * 10 + (b[11] - 48)
+        second = (b[12] - 48) * 10 + (b[13] - 48)
+        
         try:
-            # HL7 format: YYYYMMDDHHMMSS
-            # Example: 19651115062241
-            if len(hl7_datetime) >= 14:
-                year = int(hl7_datetime[0:4])
-                month = int(hl7_datetime[4:6])
-                day = int(hl7_datetime[6:8])
-                hour = int(hl7_datetime[8:10])
-                minute = int(hl7_datetime[10:12])
-                second = int(hl7_datetime[12:14])
-                
-                # Create datetime object
-                return datetime.datetime(year, month, day, hour, minute, second)
-            else:
-                logger.warning(f"Invalid HL7 datetime format: {hl7_datetime}")
-                return None
-        except Exception as e:
-            logger.error(f"Error converting HL7 datetime {hl7_datetime}: {str(e)}")
+            return datetime.datetime(year, month, day, hour, minute, second)
+        except ValueError:
+            # Digits that are out of range, e.g. month 13
+            self._count_bad_datetime()
             return None
 
-    def _find_element_with_template_id(self, parent, template_id_root, namespaces):
-        """Find an element that has a templateId with the specified root."""
-        for elem in parent.findall('.//cda:*', namespaces):
-            template_ids = elem.findall('.//cda:templateId', namespaces)
-            for template_id in template_ids:
-                if template_id.get('root') == template_id_root:
-                    return elem
-        return None
-
-    def _parse_cda_xml(self, xml_content: str) -> Dict[str, List[Dict[str, Any]]]:
-        """Parse CDA XML message and organize data by sections."""
+    def _count_bad_datetime(self):
+        """Record an unparseable HL7 datetime; they are reported once per run."""
+        with self._bad_dt_lock:
+            self._bad_dt_count += 1
+
+    @staticmethod
+    def _release_element(elem, parent):
+        """Free a processed element and the already-processed siblings before it."""
+        if not _FAST:
+            # ElementTree has no parent links; the caller tracks the parent
+            elem.clear()
+            parent.remove(elem)
+            return
+        elem.clear(keep_tail=True)
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    def _extract_patient(self, patient) -> Dict[str, Any]:
+        """Extract demographics from a recordTarget patient element."""
+        patient_data = {}
+
+        # Extract patient ID
+        patient_ids = XP_ID(patient)
+        if patient_ids:
+            patient_data['patient_ids'] = [f"{pid.get('root')}:{pid.get('extension')}" for pid in patient_ids if pid.get('root') and pid.get('extension')]
+
+        # Extract patient name
+        names = XP_NAME(patient)
+        if names:
+            name_data = []
+            for name in names:
+                name_info = {}
+                given = name.findall(CDA_GIVEN)
+                family = name.find(CDA_FAMILY)
+
+                if given:
+                    name_info['given'] = ' '.join([g.text for g in given if g.text])
+                if family is not None and family.text:
+                    name_info['family'] = family.text
+
+                if name_info:
+                    name_data.append(name_info)
+
+            if name_data:
+                patient_data['names'] = name_data
+
+        # Extract patient gender
+        gender = _first(patient, CDA_GENDER)
+        if gender is not None:
+            patient_data['gender'] = gender.get('code')
+            patient_data['gender_display'] = gender.get('displayName')
+
+        # Extract patient birth time
+        birth_time = _first(patient, CDA_BIRTH_TIME)
+        if birth_time is not None:
+            birth_time_value = birth_time.get('value')
+            if birth_time_value:
+                patient_data['birth_time'] = self._convert_hl7_datetime(birth_time_value)
+
+        return patient_data
+
+    def _extract_encounter(self, encounter) -> Dict[str, Any]:
+        """Extract a single encounter activity."""
+        encounter_data = {}
+
+        # Extract encounter ID
+        encounter_id = _first(encounter, CDA_ID)
+        if encounter_id is not None:
+            encounter_data['encounter_id'] = f"{encounter_id.get('root')}:{encounter_id.get('extension')}"
+
+        # Extract encounter code
+        code = _first(encounter, CDA_CODE)
+        if code is not None:
+            encounter_data['encounter_code'] = code.get('code')
+            encounter_data['encounter_code_system'] = code.get('codeSystem')
+            encounter_data['encounter_code_display'] = code.get('displayName')
+
+        # Extract encounter time
+        time = _first(encounter, CDA_EFFECTIVE_TIME)
+        if time is not None:
+            low = time.find(CDA_LOW)
+            high = time.find(CDA_HIGH)
+
+            if low is not None:
+                hl7_start = low.get('value')
+                encounter_data['encounter_start'] = self._convert_hl7_datetime(hl7_start)
+            if high is not None:
+                hl7_end = high.get('value')
+                encounter_data['encounter_end'] = self._convert_hl7_datetime(hl7_end)
+
+        return encounter_data
+
+    def _extract_problem(self, act) -> Dict[str, Any]:
+        """Extract a problem concern act."""
+        problem = {}
+
+        # Extract problem ID, from the concern act and its problem observations
+        problem_ids = act.findall(CDA_ID) + XP_ACT_OBS_ID(act)
+        if problem_ids:
+            problem['problem_ids'] = [f"{pid.get('root')}:{pid.get('extension')}" for pid in problem_ids if pid.get('root') and pid.get('extension')]
+
+        # Extract problem code from the problem observation
+        codes = XP_ACT_OBS_VALUE(act)
+        code = codes[0] if codes else None
+        if code is not None:
+            problem['problem_code'] = code.get('code')
+            problem['problem_code_system'] = code.get('codeSystem')
+            problem['problem_code_display'] = code.get('displayName')
+
+        # Extract problem status
+        status = act.find(CDA_STATUS_CODE)
+        if status is not None:
+            problem['problem_status'] = status.get('code')
+
+        # Extract problem time
+        time = act.find(CDA_EFFECTIVE_TIME)
+        if time is not None:
+            low = time.find(CDA_LOW)
+            high = time.find(CDA_HIGH)
+
+            if low is not None:
+                hl7_start = low.get('value')
+                problem['problem_start'] = self._convert_hl7_datetime(hl7_start)
+            if high is not None:
+                hl7_end = high.get('value')
+                problem['problem_end'] = self._convert_hl7_datetime(hl7_end)
+
+        return problem
+
+    def _extract_medication(self, substance_admin) -> Dict[str, Any]:
+        """Extract a medication activity."""
+        medication = {}
+
+        # Extract medication ID - directly from the substanceAdministration element
+        medication_id = substance_admin.find(CDA_ID)
+        if medication_id is not None:
+            root = medication_id.get('root')
+            extension = medication_id.get('extension')
+            if root and extension:
+                medication['medication_ids'] = f"{root}:{extension}"
+
+        # Extract medication code from the administered product
+        codes = XP_MED_CODE(substance_admin)
+        code = codes[0] if codes else None
+        if code is not None:
+            medication['medication_code'] = code.get('code')
+            medication['medication_code_system'] = code.get('codeSystem')
+            medication['medication_code_display'] = code.get('displayName')
+
+        # Extract medication status
+        status = substance_admin.find(CDA_STATUS_CODE)
+        if status is not None:
+            medication['medication_status'] = status.get('code')
+
+        # Extract medication time
+        time = substance_admin.find(CDA_EFFECTIVE_TIME)
+        if time is not None:
+            low = time.find(CDA_LOW)
+            high = time.find(CDA_HIGH)
+
+            if low is not None:
+                hl7_start = low.get('value')
+                medication['medication_start'] = self._convert_hl7_datetime(hl7_start)
+            if high is not None:
+                hl7_end = high.get('value')
+                medication['medication_end'] = self._convert_hl7_datetime(hl7_end)
+
+        return medication
+
+    def _parse_cda_xml_stream(self, source) -> Dict[str, List[Dict[str, Any]]]:
+        """Parse a CDA XML file path or binary file object, organized by sections.
+
+        The document is streamed with iterparse (lxml's, or ElementTree's when
+        lxml is not installed) straight from the source, so the file is never
+        held in memory as a whole. Each entry is extracted once at its end
+        event and freed straight afterwards. With lxml the stream is filtered
+        to CDA_STREAM_TAGS and narrative text is freed with its section; with
+        ElementTree every element outside an entry is freed at its own end
+        event. Either way the tree built so far stays small however long the
+        document.
+        """
         try:
-            # Log the XML content for debugging
-            logger.info(f"XML content length: {len(xml_content)}")
-            logger.info(f"First 500 characters of XML: {xml_content[:500]}")
-            
-            # Parse XML with namespace handling
-            root = ET.fromstring(xml_content)
-            
-            # Define namespaces
-            namespaces = {
-                'cda': 'urn:hl7-org:v3',
-                'sdtc': 'urn:hl7-org:sdtc',
-                'xsi': 'http://www.w3.org/2001/XMLSchema-instance'
-            }
-            
-            # Initialize data dictionary
-            section_data = {}
-            
-            # Extract document metadata
             metadata = {}
-            type_id = root.find('.//cda:typeId', namespaces)
-            if type_id is not None:
-                metadata['document_type'] = type_id.get('extension')
-                metadata['document_type_root'] = type_id.get('root')
-            
-            template_ids = root.findall('.//cda:templateId', namespaces)
-            if template_ids:
-                metadata['template_ids'] = [f"{t.get('root')}:{t.get('extension')}" for t in template_ids if t.get('root') and t.get('extension')]
-            
-            # Add metadata to section data
-            section_data['metadata'] = [metadata]
+            template_ids = []
+            patient_data = None
+            encounters = []
+            problems = []
+            medications = []
             
-            # Extract patient information
-            patient_data = {}
-            patient = root.find('.//cda:patient', namespaces)
-            if patient is not None:
-                # Extract patient ID
-                patient_ids = patient.findall('.//cda:id', namespaces)
-                if patient_ids:
-                    patient_data['patient_ids'] = [f"{pid.get('root')}:{pid.get('extension')}" for pid in patient_ids if pid.get('root') and pid.get('extension')]
-                
-                # Extract patient name
-                names = patient.findall('.//cda:name', namespaces)
-                if names:
-                    name_data = []
-                    for name in names:
-                        name_info = {}
-                        given = name.findall('.//cda:given', namespaces)
-                        family = name.find('.//cda:family', namespaces)
-                        
-                        if given:
-                            name_info['given'] = ' '.join([g.text for g in given if g.text])
-                        if family is not None and family.text:
-                            name_info['family'] = family.text
-                        
-                        if name_info:
-                            name_data.append(name_info)
-                    
-                    if name_data:
-                        patient_data['names'] = name_data
+            if _FAST:
+                context = _ET.iterparse(source, events=('end',), tag=CDA_STREAM_TAGS)
+            else:
+                # ElementTree cannot filter by tag or find parents, so open
+                # elements are tracked on a stack to free everything outside
+                # an entry as it ends
+                context = _ET.iterparse(source, events=('start', 'end'))
+                open_elements = []
+                open_entries = 0
+            for event, elem in context:
+                tag = elem.tag
+                if event == 'start':
+                    open_elements.append(elem)
+                    if tag in CDA_ENTRY_TAGS:
+                        open_entries += 1
+                    continue
+                if not _FAST:
+                    open_elements.pop()
+                    if tag in CDA_ENTRY_TAGS:
+                        open_entries -= 1
                 
-                # Extract patient gender
-                gender = patient.find('.//cda:administrativeGenderCode', namespaces)
-                if gender is not None:
-                    patient_data['gender'] = gender.get('code')
-                    patient_data['gender_display'] = gender.get('displayName')
+                # Document metadata comes from the first typeId and every templateId
+                if tag == CDA_TYPE_ID:
+                    if 'document_type' not in metadata:
+                        metadata['document_type'] = elem.get('extension')
+                        metadata['document_type_root'] = elem.get('root')
+                elif tag == CDA_TEMPLATE_ID:
+                    if elem.get('root') and elem.get('extension'):
+                        template_ids.append(f"{elem.get('root')}:{elem.get('extension')}")
+                elif tag in CDA_ENTRY_TAGS:
+                    if tag == CDA_PATIENT:
+                        if patient_data is None:
+                            patient_data = self._extract_patient(elem)
+                    elif tag == CDA_ENCOUNTER:
+                        encounters.append(self._extract_encounter(elem))
+                    elif tag == CDA_ACT:
+                        if XP_IS_PROBLEM_ACT(elem):
+                            problems.append(self._extract_problem(elem))
+                    elif XP_IS_MEDICATION_ACTIVITY(elem):
+                        # substanceAdministration
+                        medications.append(self._extract_medication(elem))
                 
-                # Extract patient birth time
-                birth_time = patient.find('.//cda:birthTime', namespaces)
-                if birth_time is not None:
-                    birth_time_value = birth_time.get('value')
-                    if birth_time_value:
-                        patient_data['birth_time'] = self._convert_hl7_datetime(birth_time_value)
+                if _FAST:
+                    # Sections and entries are freed as they end; an entry nested
+                    # in another entry is freed along with it
+                    is_container = tag == CDA_SECTION or tag in CDA_ENTRY_TAGS
+                    if is_container and next(elem.iterancestors(*CDA_ENTRY_TAGS), None) is None:
+                        self._release_element(elem, None)
+                # Children of an open entry are kept until the entry is extracted;
+                # the root is left in place
+                elif open_entries == 0 and open_elements:
+                    self._release_element(elem, open_elements[-1])
             
-            # Add patient data to section data
+            if template_ids:
+                metadata['template_ids'] = template_ids
+            
+            # Initialize data dictionary
+            section_data = {'metadata': [metadata]}
             if patient_data:
                 section_data['patient'] = [patient_data]
-            
-            # Extract encounter information
-            encounters = []
-            for entry in root.findall('.//cda:entry', namespaces):
-                encounter = entry.find('.//cda:encounter', namespaces)
-                if encounter is not None:
-                    encounter_data = {}
-                    
-                    # Extract encounter ID
-                    encounter_id = encounter.find('.//cda:id', namespaces)
-                    if encounter_id is not None:
-                        encounter_data['encounter_id'] = f"{encounter_id.get('root')}:{encounter_id.get('extension')}"
-                    
-                    # Extract encounter code
-                    code = encounter.find('.//cda:code', namespaces)
-                    if code is not None:
-                        encounter_data['encounter_code'] = code.get('code')
-                        encounter_data['encounter_code_system'] = code.get('codeSystem')
-                        encounter_data['encounter_code_display'] = code.get('displayName')
-                    
-                    # Extract encounter time
-                    time = encounter.find('.//cda:effectiveTime', namespaces)
-                    if time is not None:
-                        low = time.find('.//cda:low', namespaces)
-                        high = time.find('.//cda:high', namespaces)
-                        
-                        if low is not None:
-                            hl7_start = low.get('value')
-                            encounter_data['encounter_start'] = self._convert_hl7_datetime(hl7_start)
-                        if high is not None:
-                            hl7_end = high.get('value')
-                            encounter_data['encounter_end'] = self._convert_hl7_datetime(hl7_end)
-                    
-                    encounters.append(encounter_data)
-            
-            # Add encounters to section data
             if encounters:
                 section_data['encounter'] = encounters
-            
-            # Extract problems section - using a simpler approach
-            problems = []
-            # Find all act elements
-            acts = root.findall('.//cda:act', namespaces)
-            for act in acts:
-                # Check if this act has the problem template ID
-                template_ids = act.findall('.//cda:templateId', namespaces)
-                is_problem = False
-                for template_id in template_ids:
-                    if template_id.get('root') == "2.16.840.1.113883.10.20.22.4.3":
-                        is_problem = True
-                        break
-                
-                if is_problem:
-                    problem = {}
-                    
-                    # Extract problem ID
-                    problem_ids = act.findall('.//cda:id', namespaces)
-                    if problem_ids:
-                        problem['problem_ids'] = [f"{pid.get('root')}:{pid.get('extension')}" for pid in problem_ids if pid.get('root') and pid.get('extension')]
-                    
-                    # Extract problem code
-                    code = act.find('.//cda:value', namespaces)
-                    if code is not None:
-                        problem['problem_code'] = code.get('code')
-                        problem['problem_code_system'] = code.get('codeSystem')
-                        problem['problem_code_display'] = code.get('displayName')
-                    
-                    # Extract problem status
-                    status = act.find('.//cda:statusCode', namespaces)
-                    if status is not None:
-                        problem['problem_status'] = status.get('code')
-                    
-                    # Extract problem time
-                    time = act.find('.//cda:effectiveTime', namespaces)
-                    if time is not None:
-                        low = time.find('.//cda:low', namespaces)
-                        high = time.find('.//cda:high', namespaces)
-                        
-                        if low is not None:
-                            hl7_start = low.get('value')
-                            problem['problem_start'] = self._convert_hl7_datetime(hl7_start)
-                        if high is not None:
-                            hl7_end = high.get('value')
-                            problem['problem_end'] = self._convert_hl7_datetime(hl7_end)
-                    
-                    problems.append(problem)
-            
-            # Add problems to section data
             if problems:
                 section_data['problems'] = problems
-            
-            # Extract medications section - using a simpler approach
-            medications = []
-            # Find all substanceAdministration elements
-            substance_admins = root.findall('.//cda:substanceAdministration', namespaces)
-            for substance_admin in substance_admins:
-                # Check if this substanceAdministration has the medication template ID
-                template_ids = substance_admin.findall('.//cda:templateId', namespaces)
-                is_medication = False
-                for template_id in template_ids:
-                    if template_id.get('root') == "2.16.840.1.113883.10.20.22.4.16":
-                        is_medication = True
-                        break
-                
-                if is_medication:
-                    medication = {}
-                    
-                    # Extract medication ID - directly from the substanceAdministration element
-                    medication_id = substance_admin.find('.//cda:id', namespaces)
-                    if medication_id is not None:
-                        root = medication_id.get('root')
-                        extension = medication_id.get('extension')
-                        if root and extension:
-                            medication['medication_ids'] = f"{root}:{extension}"
-                    
-                    # Extract medication code
-                    code = substance_admin.find('.//cda:value', namespaces)
-                    if code is not None:
-                        medication['medication_code'] = code.get('code')
-                        medication['medication_code_system'] = code.get('codeSystem')
-                        medication['medication_code_display'] = code.get('displayName')
-                    
-                    # Extract medication status
-                    status = substance_admin.find('.//cda:statusCode', namespaces)
-                    if status is not None:
-                        medication['medication_status'] = status.get('code')
-                    
-                    # Extract medication time
-                    time = substance_admin.find('.//cda:effectiveTime', namespaces)
-                    if time is not None:
-                        low = time.find('.//cda:low', namespaces)
-                        high = time.find('.//cda:high', namespaces)
-                        
-                        if low is not None:
-                            hl7_start = low.get('value')
-                            medication['medication_start'] = self._convert_hl7_datetime(hl7_start)
-                        if high is not None:
-                            hl7_end = high.get('value')
-                            medication['medication_end'] = self._convert_hl7_datetime(hl7_end)
-                    
-                    medications.append(medication)
-            
-            # Add medications to section data
             if medications:
                 section_data['medications'] = medications
             
-            # Log the parsed data
-            for section_name, data in section_data.items():
-                logger.info(f"Section {section_name} has {len(data)} records")
-                if data:
-                    logger.info(f"Sample fields: {list(data[0].keys())}")
+            assert all(
+                row[field] is None or isinstance(row[field], datetime.datetime)
+                for rows in section_data.values()
+                for row in rows
+                for field in TIMESTAMP_FIELDS.intersection(row)
+            ), "Timestamp fields must be parsed to datetime or None"
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                for section_name, data in section_data.items():
+                    logger.debug("Section %s sample fields: %s", section_name, list(data[0].keys()))
             
             return section_data
         except Exception as e:
             logger.error(f"Error parsing CDA XML: {str(e)}")
             raise
 
-    def _flatten_data(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _flatten_data(self, section_name: str, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Flatten nested structures in the data for BigQuery compatibility."""
-        flattened_data = []
-        
-        # Define timestamp fields that should not be converted to strings
-        timestamp_fields = ['encounter_start', 'encounter_end', 'problem_start', 'problem_end', 'medication_start', 'medication_end']
-        
-        for item in data:
-            flattened_item = {}
-            
-            for key, value in item.items():
-                # Skip conversion for timestamp fields
-                if key in timestamp_fields and value is not None:
-                    flattened_item[key] = value
-                    continue
-                
-                # Special handling for medication_ids to convert to pipe-delimited string
-                if key == 'medication_ids' and isinstance(value, list):
-                    flattened_item[key] = '|'.join(value)
-                    continue
-                    
-                if isinstance(value, list):
-                    # Handle lists of strings (like IDs)
-                    if all(isinstance(x, str) for x in value):
-                        # Join the list with a delimiter
-                        flattened_item[key] = '|'.join(value)
-                    # Handle lists of dictionaries (like names)
-                    elif all(isinstance(x, dict) for x in value):
-                        # Create separate columns for each dictionary key
-                        for i, dict_item in enumerate(value):
-                            for dict_key, dict_value in dict_item.items():
-                                if isinstance(dict_value, str):
-                                    # Create a column name like 'names_0_given'
-                                    column_name = f"{key}_{i}_{dict_key}"
-                                    flattened_item[column_name] = dict_value
-                    else:
-                        # For other types of lists, convert to string
-                        flattened_item[key] = '|'.join(str(x) for x in value)
-                elif isinstance(value, dict):
-                    # Handle dictionaries by creating separate columns
-                    for dict_key, dict_value in value.items():
-                        if isinstance(dict_value, str):
-                            flattened_item[f"{key}_{dict_key}"] = dict_value
-                        else:
-                            # For non-string values, convert to string
-                            flattened_item[f"{key}_{dict_key}"] = str(dict_value)
-                else:
-                    # For non-list, non-dict values, convert to string to avoid type issues
-                    flattened_item[key] = str(value) if value is not None else None
-            
-            flattened_data.append(flattened_item)
-        
-        return flattened_data
+        flattener = self._FLATTENERS.get(section_name, _flatten_generic)
+        return [flattener(item) for item in data]
 
-    @retry.Retry(predicate=retry.if_transient_error)
     def _load_data_to_bigquery(self, section_name: str, data: List[Dict[str, Any]]):
         """Load data into BigQuery table."""
-        table_id = f"{self.project_id}.{self.dataset_id}.{section_name.lower()}"
-        
         # Flatten the data for BigQuery compatibility
-        flattened_data = self._flatten_data(data)
-        
-        # Convert data to DataFrame
-        df = pd.DataFrame(flattened_data)
-        logger.info(f"Created DataFrame with {len(df)} rows and columns: {list(df.columns)}")
-        
-        # Get the schema for the data
-        schema = self._get_segment_schema(section_name, flattened_data[0])
-        
-        # Special handling for problems table to ensure problem_end is included
-        if section_name.lower() == 'problems':
-            # Check if problem_end is in the DataFrame but not in the schema
-            if 'problem_end' in df.columns:
-                problem_end_in_schema = any(field.name == 'problem_end' for field in schema)
-                if not problem_end_in_schema:
-                    logger.info("Adding problem_end field to schema")
-                    schema.append(bigquery.SchemaField('problem_end', 'TIMESTAMP', mode='NULLABLE'))
-        
-        # Check if table exists
-        table_exists = False
-        try:
-            self.client.get_table(table_id)
-            table_exists = True
-            logger.info(f"Table {table_id} exists")
-        except Exception as e:
-            logger.info(f"Table {table_id} does not exist or error checking: {str(e)}")
-        
-        # If table exists, update schema instead of recreating
-        if table_exists:
-            try:
-                # Get current table
-                table = self.client.get_table(table_id)
-                current_schema = {field.name: field for field in table.schema}
-                
-                # Check if we need to update any fields
-                fields_to_update = []
-                for field in schema:
-                    if field.name in current_schema:
-                        if field.field_type != current_schema[field.name].field_type:
-                            logger.info(f"Field {field.name} type mismatch: current={current_schema[field.name].field_type}, new={field.field_type}")
-                            fields_to_update.append(field)
-                    else:
-                        logger.info(f"Adding new field: {field.name} ({field.field_type})")
-                        fields_to_update.append(field)
-                
-                if fields_to_update:
-                    # Update the table with new fields
-                    table.schema = table.schema + fields_to_update
-                    table = self.client.update_table(table, ["schema"])
-                    logger.info(f"Updated table {table_id} schema with {len(fields_to_update)} fields")
-            except Exception as e:
-                logger.error(f"Error updating table schema: {str(e)}")
-                # If schema update fails, recreate the table
-                logger.info(f"Recreating table {table_id} due to schema update failure")
-                self.client.delete_table(table_id)
-                self._create_table_if_not_exists(section_name, schema)
-        else:
-            # Create a new table with the schema
-            self._create_table_if_not_exists(section_name, schema)
+        flattened_data = self._flatten_data(section_name, data)
         
-        # Ensure all data is properly typed before loading
-        for field in schema:
-            field_name = field.name
-            if field_name in df.columns:
-                if field.field_type == 'TIMESTAMP':
-                    # Convert timestamp fields to datetime objects
-                    logger.info(f"Converting {field_name} to timestamp format")
-                    df[field_name] = pd.to_datetime(df[field_name], errors='coerce')
-                elif field.field_type == 'STRING':
-                    # Ensure string fields are strings
-                    df[field_name] = df[field_name].astype(str)
+        # Rows of sections with a dedicated flattener always match the registry.
+        # Generic or unregistered sections may carry extra keys; those are sent
+        # as STRING and added to the table by the load job
+        schema = list(SECTION_SCHEMAS.get(section_name, ()))
+        if section_name not in self._FLATTENERS or section_name not in SECTION_SCHEMAS:
+            known_fields = {field.name for field in schema}
+            extra_fields = {key for row in flattened_data for key in row} - known_fields
+            schema.extend(_nullable(field_name) for field_name in sorted(extra_fields))
         
-        # Log the data types of each column for debugging
-        logger.info(f"DataFrame dtypes before loading: {df.dtypes}")
+        self._load_json_to_bigquery(section_name, flattened_data, schema)
+
+    def _load_json_to_bigquery(self, section_name: str, rows: List[Dict[str, Any]], schema: List[bigquery.SchemaField]):
+        """Load rows into BigQuery as newline-delimited JSON."""
+        table_id = f"{self.project_id}.{self.dataset_id}.{section_name.lower()}"
         
-        # Load data to BigQuery
         job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            schema=schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            # Create missing tables and add new columns as part of the load
+            # job rather than with separate get/create/update calls
+            create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
+            schema_update_options=[bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION]
         )
         
         try:
-            job = self.client.load_table_from_dataframe(
-                df, table_id, job_config=job_config
+            payload = b''.join(
+                orjson.dumps(row, default=str, option=ORJSON_OPTIONS) + b'\n'
+                for row in rows
             )
-            job.result()  # Wait for the job to complete
-            
-            logger.info(f"Loaded {len(flattened_data)} rows into {table_id}")
+            self._run_load_job(payload, table_id, job_config)
+            logger.info("Loaded %d rows into %s", len(rows), table_id)
         except Exception as e:
             logger.error(f"Error loading data to {table_id}: {str(e)}")
-            # Log the data types of each column for debugging
-            logger.info(f"DataFrame dtypes: {df.dtypes}")
             raise
 
-    def process_hl7_file(self, file_path: str):
-        """Process CDA XML file and load data into BigQuery."""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                xml_content = file.read()
+    @retry.Retry(predicate=retry.if_transient_error)
+    def _run_load_job(self, payload: bytes, table_id: str, job_config: bigquery.LoadJobConfig):
+        """Load one NDJSON chunk and wait for it.
+
+        Retries cover this single chunk only, so a transient failure never
+        reloads chunks that already made it into the table.
+        """
+        job = self.client.load_table_from_file(
+            io.BytesIO(payload), table_id, job_config=job_config
+        )
+        job.result()  # Wait for the job to complete
+
+    def _parse_only(self, file_path: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Parse a CDA XML file into section data without touching BigQuery."""
+        # Parse the XML file as it is read
+        section_data = self._parse_cda_xml_stream(file_path)
+        logger.info(
+            "Parsed CDA XML file %s: %s",
+            file_path, {name: len(data) for name, data in section_data.items()}
+        )
+        return section_data
+
+    def _merge_sections(self, file_path: str, section_data: Dict[str, List[Dict[str, Any]]]):
+        """Add a parsed file's section rows to the load buffers."""
+        if not section_data:
+            logger.warning("No sections found in the CDA XML file: %s", file_path)
+            return
+        
+        # Buffer all sections including problems
+        for section_name, data in section_data.items():
+            if not data:
+                logger.warning("No data found for section %s", section_name)
+                continue
             
-            # Parse the XML content
-            section_data = self._parse_cda_xml(xml_content)
+            self._buffer(section_name, data)
+
+    def _buffer(self, section_name: str, rows: List[Dict[str, Any]]):
+        """Queue rows for loading, loading the section once it reaches FLUSH_ROWS."""
+        buffered = self._row_buffers[section_name]
+        buffered.extend(rows)
+        if len(buffered) >= FLUSH_ROWS:
+            self._flush_section(section_name)
+
+    def _flush_section(self, section_name: str):
+        """Load a section's buffered rows in load jobs of at most FLUSH_ROWS rows."""
+        rows = self._row_buffers.pop(section_name, None)
+        if not rows:
+            return
+        # A single large file can push the buffer well past FLUSH_ROWS, so it
+        # is split to keep each load job bounded
+        for start in range(0, len(rows), FLUSH_ROWS):
+            try:
+                self._load_data_to_bigquery(section_name, rows[start:start + FLUSH_ROWS])
+            except Exception:
+                # Earlier chunks are already in the table; keep only the rest
+                # so a later flush() does not load them twice
+                self._row_buffers[section_name] = rows[start:]
+                raise
+
+    def flush(self):
+        """Load all buffered rows into BigQuery."""
+        for section_name in list(self._row_buffers):
+            self._flush_section(section_name)
+
+    def process_hl7_files(self, file_paths: List[str], workers: int = 1):
+        """Parse CDA XML files and buffer their data for loading into BigQuery.
+
+        Rows are accumulated per section across files (and across calls) so
+        small sections such as metadata and patient are not written with one
+        load job per file. A section is loaded once it holds FLUSH_ROWS rows;
+        call flush() to load whatever remains. With more than one worker the
+        files are parsed concurrently in a thread pool; results are merged as
+        they complete, on the calling thread.
+        """
+        try:
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {
+                        executor.submit(self._parse_only, file_path): file_path
+                        for file_path in file_paths
+                    }
+                    for future in as_completed(futures):
+                        self._merge_sections(futures[future], future.result())
+            else:
+                for file_path in file_paths:
+                    self._merge_sections(file_path, self._parse_only(file_path))
             
-            if not section_data:
-                logger.warning("No sections found in the CDA XML file")
-                return
+            if self._bad_dt_count:
+                logger.warning("%d invalid HL7 datetimes in %d CDA XML file(s)", self._bad_dt_count, len(file_paths))
             
-            # Process all sections including problems
-            for section_name, data in section_data.items():
-                if not data:
-                    logger.warning(f"No data found for section {section_name}")
-                    continue
-                
-                # Load data (this will create or update the table as needed)
-                self._load_data_to_bigquery(section_name, data)
-                
-            logger.info(f"Successfully processed CDA XML file: {file_path}")
+            logger.info(f"Successfully processed {len(file_paths)} CDA XML file(s)")
             
         except Exception as e:
             logger.error(f"Error processing CDA file: {str(e)}")
             raise
+        finally:
+            self._bad_dt_count = 0
+
+    def process_hl7_file(self, file_path: str):
+        """Parse a CDA XML file and buffer its data; see process_hl7_files."""
+        self.process_hl7_files([file_path])
+
+    def process_hl7_directory(self, directory: str, workers: int = 8):
+        """Parse and buffer every CDA XML file in a directory using a pool of parser threads."""
+        self.process_hl7_files(_collect_cda_files([directory]), workers=workers)
+
+
+def _collect_cda_files(paths: List[str]) -> List[str]:
+    """Expand files, directories (their *.xml files) and glob patterns into file paths."""
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths.extend(sorted(glob.glob(os.path.join(path, '*.xml'))))
+        elif glob.has_magic(path):
+            file_paths.extend(sorted(glob.glob(path)))
+        else:
+            file_paths.append(path)
+    return file_paths
+
 
 def main():
     # Set up argument parser
-    parser = argparse.ArgumentParser(description='Process CDA XML file and load into BigQuery')
-    parser.add_argument('hl7_file', help='Path to the CDA XML file to process')
+    parser = argparse.ArgumentParser(description='Process CDA XML files and load into BigQuery')
+    parser.add_argument('hl7_paths', nargs='+', help='CDA XML files, directories or glob patterns to process')
+    parser.add_argument('--workers', type=int, default=8, help='Number of threads used to parse files (default: 8)')
     args = parser.parse_args()
 
-    # Process the CDA file
+    file_paths = _collect_cda_files(args.hl7_paths)
+    if not file_paths:
+        parser.error('no CDA XML files found')
+
+    logger.info("GCP_PROJECT_ID: %s, BIGQUERY_DATASET: %s", GCP_PROJECT_ID, BIGQUERY_DATASET)
+
+    # Process the CDA files
     processor = HL7ToBigQuery()
-    processor.process_hl7_file(args.hl7_file)
+    processor.process_hl7_files(file_paths, workers=args.workers)
+    processor.flush()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,36 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+MODULE_PATH = Path(__file__).resolve().parent.parent / 'hl7_to_bigquery.py'
+
+
+@pytest.fixture(params=['lxml', 'stdlib'])
+def backend(request):
+    """XML backend the module is loaded with."""
+    return request.param
+
+
+@pytest.fixture
+def hl7(backend, monkeypatch):
+    """hl7_to_bigquery loaded fresh, on lxml or on the ElementTree fallback."""
+    if backend == 'lxml':
+        pytest.importorskip('lxml')
+    else:
+        monkeypatch.setitem(sys.modules, 'lxml', None)
+    spec = importlib.util.spec_from_file_location(f'hl7_to_bigquery_{backend}', MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module._FAST == (backend == 'lxml')
+    return module
+
+
+@pytest.fixture
+def processor(hl7, monkeypatch):
+    """A processor that never talks to BigQuery."""
+    monkeypatch.setattr(hl7, 'GCP_PROJECT_ID', 'test-project')
+    monkeypatch.setattr(hl7.HL7ToBigQuery, '_ensure_client', classmethod(lambda cls: None))
+    monkeypatch.setattr(hl7.HL7ToBigQuery, '_dataset_checked', True)
+    return hl7.HL7ToBigQuery()
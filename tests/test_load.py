@@ -0,0 +1,90 @@
+import json
+import time
+
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+
+
+class FakeJob:
+    def result(self):
+        return self
+
+
+class FakeClient:
+    """Records the rows of every load job; raises the errors queued per call."""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.calls = 0
+        self.jobs = []
+
+    def load_table_from_file(self, file_obj, table_id, job_config=None):
+        self.calls += 1
+        if self.calls in self.errors:
+            raise self.errors[self.calls]
+        self.jobs.append([json.loads(line)['encounter_id'] for line in file_obj.read().splitlines()])
+        return FakeJob()
+
+
+@pytest.fixture
+def backend():
+    """Loading does not depend on the XML backend."""
+    return 'stdlib'
+
+
+@pytest.fixture
+def loader(hl7, processor, monkeypatch):
+    monkeypatch.setattr(hl7, 'FLUSH_ROWS', 3)
+    processor.client = FakeClient()
+    return processor
+
+
+def _rows(start, stop):
+    return [{'encounter_id': str(i)} for i in range(start, stop)]
+
+
+def test_flush_splits_buffer_into_flush_rows_jobs(loader):
+    loader._row_buffers['encounter'] = _rows(0, 8)
+
+    loader.flush()
+
+    assert loader.client.jobs == [['0', '1', '2'], ['3', '4', '5'], ['6', '7']]
+    assert not loader._row_buffers
+
+
+def test_failed_chunk_keeps_only_unloaded_rows(loader):
+    loader.client.errors = {2: ValueError('load failed')}
+    loader._row_buffers['encounter'] = _rows(0, 8)
+
+    with pytest.raises(ValueError):
+        loader.flush()
+
+    assert loader.client.jobs == [['0', '1', '2']]
+    assert loader._row_buffers['encounter'] == _rows(3, 8)
+
+    loader.flush()
+
+    assert loader.client.jobs == [['0', '1', '2'], ['3', '4', '5'], ['6', '7']]
+    assert not loader._row_buffers
+
+
+def test_buffer_loads_section_at_flush_rows(loader):
+    loader._buffer('encounter', _rows(0, 2))
+    assert loader.client.jobs == []
+
+    loader._buffer('encounter', _rows(2, 3))
+
+    assert loader.client.jobs == [['0', '1', '2']]
+    assert not loader._row_buffers['encounter']
+
+
+def test_transient_error_retries_only_the_failing_chunk(loader, monkeypatch):
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    loader.client.errors = {2: ServiceUnavailable('backend unavailable')}
+    loader._row_buffers['encounter'] = _rows(0, 6)
+
+    loader.flush()
+
+    assert loader.client.calls == 3
+    assert loader.client.jobs == [['0', '1', '2'], ['3', '4', '5']]
+    assert not loader._row_buffers
@@ -0,0 +1,99 @@
+import datetime
+import logging
+from pathlib import Path
+
+import pytest
+
+SAMPLE_PATH = Path(__file__).resolve().parent.parent / 'hl7.xml'
+
+
+def test_parse_sample_document(processor):
+    sections = processor._parse_only(str(SAMPLE_PATH))
+
+    assert {name: len(rows) for name, rows in sections.items()} == {
+        'metadata': 1,
+        'patient': 1,
+        'encounter': 21,
+        'problems': 10,
+        'medications': 1,
+    }
+
+    metadata = sections['metadata'][0]
+    assert metadata['document_type'] == 'POCD_HD000040'
+    assert metadata['document_type_root'] == '2.16.840.1.113883.1.3'
+    assert len(metadata['template_ids']) == 361
+
+    patient = sections['patient'][0]
+    assert patient['names'] == [{'given': 'Aaron697', 'family': 'Brekke496'}]
+    assert patient['gender'] == 'M'
+    assert patient['birth_time'] == datetime.datetime(1945, 12, 10, 6, 22, 41)
+
+    encounter = sections['encounter'][0]
+    assert encounter['encounter_code'] == '410429000'
+    assert encounter['encounter_code_display'] == 'Cardiac Arrest'
+    assert encounter['encounter_start'] == datetime.datetime(1965, 11, 15, 6, 22, 41)
+    assert encounter['encounter_end'] == datetime.datetime(1965, 11, 15, 8, 7, 41)
+
+    problem = sections['problems'][0]
+    assert problem['problem_code'] == '410429000'
+    assert problem['problem_status'] == 'active'
+    assert problem['problem_start'] == datetime.datetime(1965, 11, 15, 6, 22, 41)
+
+    medication = sections['medications'][0]
+    assert medication['medication_code'] == '310965'
+    assert medication['medication_code_system'] == '2.16.840.1.113883.6.88'
+    assert medication['medication_code_display'] == 'Ibuprofen 200 MG Oral Tablet'
+    assert medication['medication_status'] == 'completed'
+    assert medication['medication_start'] == datetime.datetime(2016, 5, 21, 7, 22, 41)
+    assert medication['medication_end'] == datetime.datetime(2016, 6, 20, 7, 22, 41)
+
+
+def test_parse_releases_processed_elements(hl7, processor, monkeypatch):
+    """Sections, narrative and entries are freed as the document streams."""
+    iterparse = hl7._ET.iterparse
+    counts = []
+
+    def counting_iterparse(source, **kwargs):
+        root = None
+        for event, elem in iterparse(source, **kwargs):
+            if root is None:
+                root = elem
+            yield event, elem
+            if event == 'end' and elem.tag == hl7.CDA + 'section':
+                counts.append(sum(1 for _ in root.iter()))
+
+    monkeypatch.setattr(hl7._ET, 'iterparse', counting_iterparse)
+    processor._parse_only(str(SAMPLE_PATH))
+
+    # The sample holds about 7,000 elements across 11 sections; only the
+    # parser's read-ahead and the open path to the root should stay in memory
+    assert len(counts) > 10
+    assert max(counts) < 1000
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('19651115062241', datetime.datetime(1965, 11, 15, 6, 22, 41)),
+    ('19651115062241-0500', datetime.datetime(1965, 11, 15, 6, 22, 41)),
+    ('196511150622', None),
+    ('19651315062241', None),
+    ('١٩٦٥١١١٥٠٦٢٢٤١', None),
+])
+def test_convert_hl7_datetime(processor, value, expected):
+    assert processor._convert_hl7_datetime(value) == expected
+    assert processor._bad_dt_count == (0 if expected else 1)
+
+
+def test_invalid_datetimes_reported_once_per_run(processor, tmp_path, caplog):
+    document = tmp_path / 'bad.xml'
+    document.write_text(
+        '<ClinicalDocument xmlns="urn:hl7-org:v3"><recordTarget><patientRole>'
+        '<patient><birthTime value="1945"/></patient>'
+        '</patientRole></recordTarget></ClinicalDocument>'
+    )
+
+    with caplog.at_level(logging.WARNING):
+        processor.process_hl7_files([str(document), str(document)])
+
+    warnings = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+    assert warnings == ['2 invalid HL7 datetimes in 2 CDA XML file(s)']
+    assert processor._bad_dt_count == 0